@@ -14,12 +14,16 @@ SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
 CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
-from io import StringIO
+import csv
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+from io import BytesIO
+from itertools import pairwise
 from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple, Sequence
 
-from anastruct import SystemElements
-import pandas as pd
-from matplotlib.figure import Figure
+import numpy as np
 
 from viktor import ViktorController, UserError
 from viktor.parametrization import (
@@ -45,19 +49,131 @@ from viktor.views import (
     DataStatus,
 )
 
+if TYPE_CHECKING:
+    # anastruct and matplotlib are slow to import, so they are only imported once a model is created
+    from anastruct import SystemElements
+    from matplotlib.figure import Figure
 
+
+# The profile properties that are used by the app, the other columns of the profile libraries are not read
+_PROFILE_PROPERTIES = ("Depth", "Weight", "Second moment of area")
+
+
+def _parse_column(values: list[str]) -> list[int] | list[float]:
+    """Parses the values of a profile library column into integers, or into floats if not all of them are integers."""
+    try:
+        return [int(value) for value in values]
+    except ValueError:
+        return [float(value) for value in values]
+
+
+@lru_cache(maxsize=8)
+def _load_profile_dict(profile_type: str) -> dict[str, dict[str, int | float]]:
+    """Reads the profile library of the given profile type into a dict that maps each profile name to its properties.
+
+    The result is cached, so do not modify it in place.
+    """
+    file_path = Path(__file__).parent / "profiles" / f"steel-profiles-{profile_type}.csv"
+    with open(file_path, newline="", encoding="utf-8-sig") as f:
+        rows = list(csv.reader(f))
+
+    # The property names are on the third row, followed by three rows with symbols, units and remarks
+    names, profile_rows = rows[2], rows[6:]
+    columns = {}
+    for name in _PROFILE_PROPERTIES:
+        # Properties about both axes share a name, `index` finds the first one (major axis y-y)
+        i = names.index(name)
+        columns[name] = _parse_column([row[i] for row in profile_rows])
+    return {row[0]: {name: values[j] for name, values in columns.items()} for j, row in enumerate(profile_rows)}
+
+
+@lru_cache(maxsize=8)
+def _profile_names(profile_type: str) -> list[str]:
+    return list(_load_profile_dict(profile_type))
+
+
+@lru_cache(maxsize=8)
+def _profile_section_moduli(profile_type: str) -> tuple[np.ndarray, np.ndarray]:
+    """Returns the profile names of the given profile type and their elastic section moduli (x 10^6 mm3) as arrays.
+
+    The arrays are cached and therefore read-only.
+    """
+    profile_properties = _load_profile_dict(profile_type)
+    profiles = np.array(list(profile_properties))
+    moments_of_inertia = np.array([prop["Second moment of area"] for prop in profile_properties.values()])
+    profile_heights = np.array([prop["Depth"] for prop in profile_properties.values()])
+    section_moduli = moments_of_inertia / (profile_heights / 2)
+    profiles.flags.writeable = False
+    section_moduli.flags.writeable = False
+    return profiles, section_moduli
+
+
+@lru_cache(maxsize=32)
+def _id_options(count: int) -> list[str]:
+    return [str(i) for i in range(1, count + 1)]
+
+
+# The option callbacks are called on every refresh of the editor and return cached lists, which should not be modified
 def get_profile_types(params, **kwargs):
-    file_path = Path(__file__).parent / "profiles" / f"steel-profiles-{params.input.profile_type}.csv"
-    df = pd.read_csv(file_path, header=[2], skiprows=[3, 4, 5])
-    return df["Profile"].values.tolist()
+    return _profile_names(params.input.profile_type)
 
 
 def get_node_id_options(params, **kwargs):
-    return [str(i) for i in range(1, len(params.input.nodes) + 1)]
+    return _id_options(len(params.input.nodes))
 
 
 def get_element_id_options(params, **kwargs):
-    return [str(i) for i in range(1, len(params.input.nodes))]
+    return _id_options(len(params.input.nodes) - 1)
+
+
+class ModelInput(NamedTuple):
+    """The parameters that define an anastruct model, in a hashable form so that models can be cached."""
+
+    nodes: tuple[tuple[float, float], ...]
+    supports: tuple[tuple[str, int], ...]
+    point_loads: tuple[tuple[int, float, float], ...]
+    distributed_loads: tuple[tuple[int, float], ...]
+    profile_type: str
+    profile: str
+    include_weight: bool
+
+    @classmethod
+    def from_params(cls, params) -> "ModelInput":
+        return cls(
+            nodes=tuple((node.x, node.y) for node in params.input.nodes),
+            # The IDs are selected in OptionFields and therefore strings. Supports without a type, such as a newly added
+            # row in the table, are skipped
+            supports=tuple(
+                (support.type, int(support.node_id))
+                for support in params.input.supports
+                if support.type in ("Fixed", "Hinged", "Roll")
+            ),
+            point_loads=tuple(
+                (int(point_load.node_id), point_load.fx, point_load.fy) for point_load in params.input.point_loads
+            ),
+            distributed_loads=tuple(
+                (int(distributed_load.element_id), distributed_load.q)
+                for distributed_load in params.input.distributed_loads
+            ),
+            profile_type=params.input.profile_type,
+            profile=params.input.profile,
+            include_weight=params.input.include_weight,
+        )
+
+
+def _calculate_max_moments(model_input: ModelInput, profiles: Sequence[str]) -> list[float]:
+    """Calculates the maximum absolute bending moment of a model for each of the given profiles.
+
+    The model is built once and solved again after applying each profile. Defined at module level so it can run in
+    other processes.
+    """
+    ss = Controller.build_model(model_input)
+    max_moments = []
+    for profile in profiles:
+        Controller.apply_profile(ss, model_input.profile_type, profile, model_input.include_weight)
+        Controller.solve(ss)
+        max_moments.append(max(map(abs, ss.get_element_result_range("moment"))))
+    return max_moments
 
 
 class Parametrization(ViktorParametrization):
@@ -144,32 +260,25 @@ class Controller(ViktorController):
     @ImageView("Structure", duration_guess=1)
     def create_structure(self, params, **kwargs):
         """Initiates the process of rendering the structure visualization."""
-        ss = self.create_model(params, solve_model=False)
-        fig = ss.show_structure(show=False)
-        return ImageResult(self.fig_to_svg(fig))
+        return ImageResult(self.render_model(params, "show_structure", solve_model=False))
 
     @ImageView("Reaction forces", duration_guess=1)
     def show_reaction_forces(self, params, **kwargs):
         """Initiates the process of rendering an image of the reaction forces of the structure."""
-        ss = self.create_model(params)
-        fig = ss.show_reaction_force(show=False)
-        return ImageResult(self.fig_to_svg(fig))
+        return ImageResult(self.render_model(params, "show_reaction_force"))
 
     @ImageView("Shear forces", duration_guess=1)
     def show_shear_forces(self, params, **kwargs):
         """Initiates the process of rendering an image of the shear forces of the structure."""
-        ss = self.create_model(params)
-        fig = ss.show_shear_force(show=False)
-        return ImageResult(self.fig_to_svg(fig))
+        return ImageResult(self.render_model(params, "show_shear_force"))
 
     @ImageAndDataView("Bending moments", duration_guess=1)
     def show_bending_moments(self, params, **kwargs):
         """Initiates the process of rendering an image of the bending moments of the structure,
         as well as a view of a few key values related to the bending moments."""
         ss = self.create_model(params)
-        fig = ss.show_bending_moment(show=False)
 
-        max_moment = abs(max(ss.get_element_result_range("moment"), key=abs))
+        max_moment = max(map(abs, ss.get_element_result_range("moment")))
         results = self.calculate_allowable_bending_moment(
             params.input.profile_type, params.input.profile, params.input.steel_class
         )
@@ -211,14 +320,12 @@ class Controller(ViktorController):
             ),
         )
 
-        return ImageAndDataResult(self.fig_to_svg(fig), data)
+        return ImageAndDataResult(self.render_model(params, "show_bending_moment"), data)
 
     @ImageView("Displacements", duration_guess=1)
     def show_displacements(self, params, **kwargs):
         """Initiates the process of rendering an image of the displacement of the structure."""
-        ss = self.create_model(params)
-        fig = ss.show_displacement(show=False)
-        return ImageResult(self.fig_to_svg(fig))
+        return ImageResult(self.render_model(params, "show_displacement"))
 
     def optimize_profile(self, params, **kwargs):
         """Initiates the process of optimizing structure based on the bending moment unity check.
@@ -228,23 +335,36 @@ class Controller(ViktorController):
         profile_type = params.input.profile_type
         steel_class = params.input.steel_class
 
-        profiles = get_profile_types(params)
-        results = []
-        for profile in profiles:
-            params["input"]["profile"] = profile
-            ss = self.create_model(params)
-            max_moment = abs(max(ss.get_element_result_range("moment"), key=abs))
-            allowable_moment = self.calculate_allowable_bending_moment(
-                profile_type, profile, steel_class
-            )["allowable_bending_moment"]
-            uc = abs(max_moment / allowable_moment)
-
-            if uc < 1:
-                results.append(
-                    OptimizationResultElement(
-                        {"input": {"profile": profile}}, {"uc": round(uc, 2)}
+        # Calculate the allowable bending moment of all profiles at once, see `calculate_allowable_bending_moment`
+        profiles, section_moduli = _profile_section_moduli(profile_type)
+        yield_strength = float(steel_class[-3:])
+        allowable_moments = yield_strength * section_moduli
+
+        # Without self-weight the loads do not depend on the profile. If the structure is statically determinate as
+        # well, the bending moments do not depend on the stiffness either, so a single calculation covers all profiles.
+        model_input = ModelInput.from_params(params)._replace(profile=profiles[0])
+        if model_input.include_weight or not self.is_statically_determinate(model_input):
+            # The calculations of the profiles are independent, so they can be spread over multiple processes. For small
+            # models starting the processes takes longer than the calculations themselves.
+            workers = min(os.cpu_count() or 1, len(profiles))
+            if len(model_input.nodes) > 20 and workers > 1:
+                with ProcessPoolExecutor(workers) as executor:
+                    chunks = np.array_split(profiles, workers)
+                    max_moments = np.concatenate(
+                        list(executor.map(partial(_calculate_max_moments, model_input), chunks))
                     )
-                )
+            else:
+                max_moments = np.array(_calculate_max_moments(model_input, profiles))
+        else:
+            max_moments = _calculate_max_moments(model_input, profiles[:1])[0]
+
+        # Select all passing profiles at once, keeping the library order of increasing profile size
+        ucs = max_moments / allowable_moments
+        passed = ucs < 1
+        results = [
+            OptimizationResultElement({"input": {"profile": profile}}, {"uc": round(uc, 2)})
+            for profile, uc in zip(profiles[passed], ucs[passed])
+        ]
 
         output_headers = {"uc": "UC"}
         return OptimizationResult(results, ["input.profile"], output_headers=output_headers)
@@ -252,72 +372,141 @@ class Controller(ViktorController):
     def create_model(self, params, solve_model=True):
         """Creates and returns an anastruct `SystemElements` model based on the app's given parameters.
 
+        Models are cached on the parameters that define them, so views of the same input share a single calculation.
+        The returned model may therefore be shared and should not be modified.
+
         :param params: The app's parametrization.
         :param solve_model: Boolean input to indicate whether or not to solve the initialized model.
         :return: `anastruct.SystemElements` object.
         """
+        return self._create_model(ModelInput.from_params(params), solve_model)
+
+    @staticmethod
+    @lru_cache(maxsize=8)
+    def _create_model(model_input: ModelInput, solve_model: bool) -> "SystemElements":
+        """Creates the anastruct model of `create_model` from a hashable `ModelInput`."""
+        ss = Controller.build_model(model_input)
+        if solve_model:
+            Controller.solve(ss)
+        return ss
+
+    @staticmethod
+    def build_model(model_input: ModelInput) -> "SystemElements":
+        """Creates an unsolved anastruct `SystemElements` model of the given geometry, supports, loads and profile."""
+        import matplotlib
+
+        # Figures are only rendered to images, so use the non-interactive backend before anastruct imports pyplot
+        matplotlib.use("Agg")
+        from anastruct import SystemElements
+
+        ss = SystemElements()
+
+        # Create elements
+        for start, end in pairwise(model_input.nodes):
+            ss.add_element(location=[start, end])
+
+        # Create supports
+        add_support = {
+            "Fixed": ss.add_support_fixed,
+            "Hinged": ss.add_support_hinged,
+            "Roll": partial(ss.add_support_roll, direction=2),
+        }
+        for support_type, node_id in model_input.supports:
+            add_support[support_type](node_id=node_id)
+
+        # Create point loads
+        for node_id, fx, fy in model_input.point_loads:
+            ss.point_load(node_id=node_id, Fx=fx, Fy=fy)
+
+        # Create distributed loads
+        for element_id, q in model_input.distributed_loads:
+            ss.q_load(q=q, element_id=element_id, direction="element")
+
+        Controller.apply_profile(ss, model_input.profile_type, model_input.profile, model_input.include_weight)
+        return ss
+
+    @staticmethod
+    def apply_profile(ss: "SystemElements", profile_type: str, profile: str, include_weight: bool) -> None:
+        """Applies the bending stiffness and optionally the weight of a profile to all elements of a model.
+
+        A model that was already solved has to be solved again to obtain the results of the new profile.
+
+        :param ss: The anastruct model.
+        :param profile_type: One of the following profile types: HEA, HEB or IPE.
+        :param profile: Profile name, e.g. IPE80 (IPE was given as profile_type)
+        :param include_weight: Boolean input to indicate whether or not to apply the weight as a dead load.
+        """
         youngs_modulus = 210000 * 10**3  # kN/m2
-        profile_type = params.input.profile_type
-        profile = params.input.profile
         moment_of_inertia = (
-            self.get_profile_property(profile_type, profile, "Second moment of area")
+            Controller.get_profile_property(profile_type, profile, "Second moment of area")
             / 10**6
         )  # Convert x10^6 mm4 to m4
-        ss = SystemElements(EI=youngs_modulus * moment_of_inertia)
+        ss.EI = youngs_modulus * moment_of_inertia
 
-        if params.input.include_weight:
+        if include_weight:
             weight = (
-                self.get_profile_property(profile_type, profile, "Weight") * 9.81 / 1000
+                Controller.get_profile_property(profile_type, profile, "Weight") * 9.81 / 1000
             )  # Convert kg/m to kN/m
         else:
             weight = 0
 
-        # Create elements
-        nodes = params.input.nodes
-        for i, node in enumerate(nodes[:-1]):
-            ss.add_element(
-                location=[[node.x, node.y], [nodes[i + 1].x, nodes[i + 1].y]], g=weight
+        for element in ss.element_map.values():
+            element.EI = ss.EI
+            element.dead_load = weight
+            # The stiffness matrices are compiled when the element is created, so they are recompiled with the new EI
+            element.compile_constitutive_matrix(initial=True)
+            element.compile_stiffness_matrix()
+
+    @staticmethod
+    def solve(ss: "SystemElements") -> None:
+        """Solves an anastruct model, or raises a `UserError` if it cannot be solved."""
+        try:
+            ss.solve()
+        except Exception:
+            raise UserError(
+                "Calculation cannot be solved, probably because the structure is unstable. Check the supports."
             )
 
-        # Create supports
-        for support in params.input.supports:
-            if support.type == "Fixed":
-                ss.add_support_fixed(node_id=int(support.node_id))
-            elif support.type == "Hinged":
-                ss.add_support_hinged(node_id=int(support.node_id))
-            elif support.type == "Roll":
-                ss.add_support_roll(node_id=int(support.node_id), direction=2)
+    def render_model(self, params, method_name: str, solve_model=True) -> BytesIO:
+        """Renders the model of the app's given parameters to an SVG image.
 
-        # Create point loads
-        for point_load in params.input.point_loads:
-            ss.point_load(
-                node_id=int(point_load.node_id), Fx=point_load.fx, Fy=point_load.fy
-            )
+        The SVG images are cached on the parameters that define the model, next to the models themselves.
 
-        # Create distributed loads
-        for distributed_load in params.input.distributed_loads:
-            ss.q_load(
-                q=distributed_load.q,
-                element_id=int(distributed_load.element_id),
-                direction="element",
-            )
+        :param params: The app's parametrization.
+        :param method_name: The name of the `SystemElements` plotting method, e.g. "show_bending_moment".
+        :param solve_model: Boolean input to indicate whether or not to solve the model before rendering.
+        :return: SVG `BytesIO` buffer object.
+        """
+        return BytesIO(self._render_model(ModelInput.from_params(params), method_name, solve_model))
 
-        # Solve the model
-        if solve_model:
-            try:
-                ss.solve()
-            except Exception:
-                raise UserError(
-                    "Calculation cannot be solved, probably because the structure is unstable. Check the supports."
-                )
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def _render_model(model_input: ModelInput, method_name: str, solve_model: bool) -> bytes:
+        """Renders the model of `render_model` from a hashable `ModelInput`."""
+        ss = Controller._create_model(model_input, solve_model)
+        fig = getattr(ss, method_name)(show=False)
+        return Controller.fig_to_svg(fig).getvalue()
 
-        return ss
+    @staticmethod
+    def is_statically_determinate(model_input: ModelInput) -> bool:
+        """Checks whether the internal forces of the structure follow from equilibrium alone.
+
+        Consecutive nodes are connected by elements, so without repeated coordinates the elements form an open chain.
+        Such a chain is statically determinate when the supports provide exactly three restraints (a fixed support
+        restrains 3 degrees of freedom, hinged 2 and roll 1). A node that repeats the coordinates of another node is
+        merged with it by anastruct, which closes a loop and makes the structure internally indeterminate.
+        """
+        if len(set(model_input.nodes)) != len(model_input.nodes):
+            return False
+        restraints = {"Fixed": 3, "Hinged": 2, "Roll": 1}
+        return sum(restraints[support_type] for support_type, _ in model_input.supports) == 3
 
     @staticmethod
-    def fig_to_svg(fig: Figure) -> StringIO:
-        """Converts a matplotlib `Figure` object to an SVG `StringIO` buffer object."""
-        svg_data = StringIO()
-        fig.savefig(svg_data, format="svg")
+    def fig_to_svg(fig: "Figure") -> BytesIO:
+        """Converts a matplotlib `Figure` object to an SVG `BytesIO` buffer object."""
+        svg_data = BytesIO()
+        # Skip the tight bounding box calculation and the date and creator stamps, which are of no use in a view
+        fig.savefig(svg_data, format="svg", bbox_inches=None, metadata={"Creator": None, "Date": None})
         return svg_data
 
     @staticmethod
@@ -326,11 +515,13 @@ class Controller(ViktorController):
 
         :param profile_type: One of the following profile types: HEA, HEB or IPE.
         :param profile: Profile name, e.g. IPE80 (IPE was given as profile_type)
-        :param property_name: The name of the property, e.g. Weight
+        :param property_name: The name of the property, one of: Depth, Weight or Second moment of area (major axis y-y)
         """
-        file_path = Path(__file__).parent / "profiles" / f"steel-profiles-{profile_type}.csv"
-        df = pd.read_csv(file_path, header=[2], skiprows=[3, 4, 5])
-        return df.loc[df["Profile"] == profile, property_name].item()
+        if property_name not in _PROFILE_PROPERTIES:
+            raise ValueError(
+                f"Profile property '{property_name}' is not available, choose from: {', '.join(_PROFILE_PROPERTIES)}"
+            )
+        return _load_profile_dict(profile_type)[profile][property_name]
 
     @staticmethod
     def calculate_allowable_bending_moment(profile_type: str, profile: str, steel_class: str):
@@ -341,10 +532,9 @@ class Controller(ViktorController):
         :param steel_class: The steel class, e.g. S235
         :return: A dict with the moment of inertia, profile height, yield strength and allowable bending moment.
         """
-        file_path = Path(__file__).parent / "profiles" / f"steel-profiles-{profile_type}.csv"
-        df = pd.read_csv(file_path, header=[2], skiprows=[3, 4, 5])
-        moment_of_inertia = df.loc[df["Profile"] == profile, "Second moment of area"].item()
-        profile_height = df.loc[df["Profile"] == profile, "Depth"].item()
+        properties = _load_profile_dict(profile_type)[profile]
+        moment_of_inertia = properties["Second moment of area"]
+        profile_height = properties["Depth"]
 
         # Yield strength is based on the steel class, i.e. the yields strength of S235 is 235MPa
         yield_strength = float(steel_class[-3:])